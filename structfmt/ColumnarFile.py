@@ -0,0 +1,385 @@
+import array
+import itertools
+import json
+import math
+import struct
+
+from . import strided
+from .RecordBatch import RecordBatch
+
+top_package = __import__(__name__.split('.')[0])
+
+# file: magic, column blocks of all chunks, json footer,
+# footer length (uint64 LE), magic
+_magic = b'SFCOLUMN'
+_trailer = struct.Struct('<Q8s')
+
+_integer_symbols = 'bBhHiIlLqQnNP'
+_bytes_symbols = 'csp'
+_float_symbols = 'efd'
+
+
+def _write_varint(out, value):
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _items(data, width):
+    return [data[i:i + width] for i in range(0, len(data), width)]
+
+
+def _encode_rle(data, width):
+    runs = [(item, len(list(group)))
+            for item, group in itertools.groupby(_items(data, width))]
+    out = bytearray()
+    _write_varint(out, len(runs))
+    for item, _ in runs:
+        out += item
+    for _, length in runs:
+        _write_varint(out, length)
+    return out
+
+
+def _decode_rle(payload, width):
+    runs, pos = _read_varint(payload, 0)
+    items = _items(payload[pos:pos + runs * width], width)
+    pos += runs * width
+    out = bytearray()
+    for item in items:
+        length, pos = _read_varint(payload, pos)
+        out += item * length
+    return out
+
+
+def _encode_dict(data, width):
+    items = _items(data, width)
+    indices = {}
+    for item in items:
+        indices.setdefault(item, len(indices))
+    out = bytearray()
+    _write_varint(out, len(indices))
+    for item in indices:
+        out += item
+    for item in items:
+        _write_varint(out, indices[item])
+    return out
+
+
+def _decode_dict(payload, width, count):
+    size, pos = _read_varint(payload, 0)
+    items = _items(payload[pos:pos + size * width], width)
+    pos += size * width
+    out = bytearray()
+    for _ in range(count):
+        index, pos = _read_varint(payload, pos)
+        out += items[index]
+    return out
+
+
+def _encode_delta(values):
+    out = bytearray()
+    previous = 0
+    for value in values:
+        delta = value - previous
+        previous = value
+        _write_varint(out, delta * 2 if delta >= 0 else -delta * 2 - 1)
+    return out
+
+
+def _decode_delta(payload, count):
+    values = []
+    value = 0
+    pos = 0
+    for _ in range(count):
+        zigzag, pos = _read_varint(payload, pos)
+        if zigzag & 1:
+            value -= (zigzag + 1) >> 1
+        else:
+            value += zigzag >> 1
+        values.append(value)
+    return values
+
+
+def _bounds(field, values):
+    if field.symbol in _float_symbols:
+        # NaN is unordered, it would break comparison of bounds
+        values = [value for value in values if value == value]
+        if not values:
+            return None, None
+    return min(values), max(values)
+
+
+def _json_value(field, value):
+    if value is None:
+        return None
+    if field.symbol in _bytes_symbols:
+        return value.hex()
+    if field.symbol in _float_symbols and math.isinf(value):
+        # JSON has no infinity
+        return repr(value)
+    return value
+
+
+def _python_value(field, value):
+    if value is None:
+        return None
+    if field.symbol in _bytes_symbols:
+        return bytes.fromhex(value)
+    if field.symbol in _float_symbols and isinstance(value, str):
+        return float(value)
+    return value
+
+
+class ColumnarWriter:
+    """
+    Writes records of FormattedStruct as chunked columnar file.
+    Every field of a chunk is stored as a column with the smallest
+    of encodings: raw, run-length, delta (integer fields)
+    or dictionary (bytes fields), with min/max of column values.
+    """
+    def __init__(self, formatted_struct, fileobj, chunk_size=65536):
+        """
+        :param formatted_struct: FormattedStruct of records
+        :param fileobj: binary file object or path
+        :param chunk_size: count of records in chunk
+        """
+        if chunk_size <= 0:
+            raise ValueError("Incorrect chunk size: " + str(chunk_size))
+        self._struct = formatted_struct
+        if isinstance(fileobj, str):
+            self._fileobj = open(fileobj, 'wb')
+            self._owned = True
+        else:
+            self._fileobj = fileobj
+            self._owned = False
+        self._chunk_bytes = chunk_size * formatted_struct.size
+        self._buffer = bytearray()
+        self._chunks = []
+        self._position = 0
+        self._closed = False
+        self._write(_magic)
+
+    def write(self, buffer):
+        """
+        Writes buffer of packed records
+        :param buffer: buffer of records, e.g. from pack_many_records
+        """
+        strided.records_view(buffer, self._struct.size)
+        self._buffer += buffer
+        while len(self._buffer) >= self._chunk_bytes:
+            self._write_chunk(memoryview(self._buffer)[:self._chunk_bytes])
+            del self._buffer[:self._chunk_bytes]
+
+    def close(self):
+        """
+        Writes remaining records and footer
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._buffer:
+            self._write_chunk(memoryview(self._buffer))
+            self._buffer = bytearray()
+        footer = json.dumps({
+            'format': self._struct.format,
+            'fields': self._struct.namedtuple._fields,
+            'chunks': self._chunks,
+        }, allow_nan=False).encode()
+        self._write(footer)
+        self._write(_trailer.pack(len(footer), _magic))
+        if self._owned:
+            self._fileobj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _write(self, data):
+        self._fileobj.write(data)
+        self._position += len(data)
+
+    def _write_chunk(self, view):
+        size = self._struct.size
+        count = len(view) // size
+        columns = []
+        for field in self._struct.fields:
+            data = bytes(strided.gather(view, field.offset, field.size,
+                                        size, count))
+            values = strided.column(memoryview(data),
+                                    field._replace(offset=0),
+                                    self._struct.byteorder, field.size, count)
+            encoding, payload = self._encode(field, data, values)
+            low, high = _bounds(field, values)
+            columns.append({
+                'offset': self._position,
+                'length': len(payload),
+                'encoding': encoding,
+                'min': _json_value(field, low),
+                'max': _json_value(field, high),
+            })
+            self._write(payload)
+        self._chunks.append({'records': count, 'columns': columns})
+
+    @staticmethod
+    def _encode(field, data, values):
+        candidates = [('raw', data),
+                      ('rle', _encode_rle(data, field.size))]
+        if field.symbol in _integer_symbols:
+            candidates.append(('delta', _encode_delta(values)))
+        if field.symbol in _bytes_symbols:
+            candidates.append(('dict', _encode_dict(data, field.size)))
+        return min(candidates, key=lambda candidate: len(candidate[1]))
+
+
+class ColumnarReader:
+    """
+    Reads records of FormattedStruct from chunked columnar file,
+    only selected columns and chunks are read.
+    """
+    def __init__(self, formatted_struct, fileobj):
+        """
+        :param formatted_struct: FormattedStruct of records
+        :param fileobj: seekable binary file object or path
+        """
+        self._struct = formatted_struct
+        if isinstance(fileobj, str):
+            self._fileobj = open(fileobj, 'rb')
+            self._owned = True
+        else:
+            self._fileobj = fileobj
+            self._owned = False
+        self._fileobj.seek(-_trailer.size, 2)
+        length, magic = _trailer.unpack(self._fileobj.read(_trailer.size))
+        if magic != _magic:
+            raise ValueError("Not a columnar records file")
+        self._fileobj.seek(-_trailer.size - length, 2)
+        footer = json.loads(self._fileobj.read(length).decode())
+        if (footer['format'] != formatted_struct.format or
+                tuple(footer['fields']) !=
+                formatted_struct.namedtuple._fields):
+            raise ValueError("Records of file don't match FormattedStruct")
+        self._chunks = footer['chunks']
+
+    @property
+    def chunk_count(self):
+        return len(self._chunks)
+
+    def __len__(self):
+        return sum(chunk['records'] for chunk in self._chunks)
+
+    def chunk_stats(self, field):
+        """
+        :param field: field name
+        :return: list of (min, max) of raw field values in every chunk,
+        NaN values are ignored, (None, None) if all values are NaN
+        """
+        index, field = self._field(field)
+        return [(_python_value(field, chunk['columns'][index]['min']),
+                 _python_value(field, chunk['columns'][index]['max']))
+                for chunk in self._chunks]
+
+    def select_chunks(self, field, min_value=None, max_value=None):
+        """
+        Finds chunks that may contain raw field values in range
+        :param field: field name
+        :param min_value: min value, unbounded if None
+        :param max_value: max value, unbounded if None
+        :return: list of chunk indices
+        """
+        return [i for i, (low, high) in enumerate(self.chunk_stats(field))
+                if (min_value is None or
+                    high is not None and high >= min_value) and
+                (max_value is None or
+                 low is not None and low <= max_value)]
+
+    def read(self, columns=None, chunks=None):
+        """
+        Reads records
+        :param columns: names of fields to read, all if None
+        :param chunks: indices of chunks to read, all if None
+        :rtype: RecordBatch
+        """
+        batches = list(self.iter_chunks(columns, chunks))
+        if not batches:
+            return RecordBatch(self._namedtuple(columns), [])
+        merged = [column[:] for column in batches[0].columns]
+        for batch in batches[1:]:
+            for column, values in zip(merged, batch.columns):
+                column.extend(values)
+        return RecordBatch(batches[0].namedtuple, merged)
+
+    def iter_chunks(self, columns=None, chunks=None):
+        """
+        Reads records by chunks
+        :param columns: names of fields to read, all if None
+        :param chunks: indices of chunks to read, all if None
+        :return: iterator of RecordBatch
+        """
+        nt = self._namedtuple(columns)
+        fields = [self._field(name) for name in nt._fields]
+        if chunks is None:
+            chunks = range(len(self._chunks))
+        for chunk in chunks:
+            chunk = self._chunks[chunk]
+            yield RecordBatch(nt, [
+                self._struct._map_column(
+                    field.name,
+                    self._read_column(field, chunk['columns'][index],
+                                      chunk['records']))
+                for index, field in fields])
+
+    def close(self):
+        if self._owned:
+            self._fileobj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _namedtuple(self, columns):
+        nt = self._struct.namedtuple
+        if columns is None:
+            return nt
+        for name in columns:
+            self._field(name)
+        return top_package.create_nt(nt.__name__, columns)
+
+    def _field(self, name):
+        for index, field in enumerate(self._struct.fields):
+            if field.name == name:
+                return index, field
+        raise ValueError("Unknown field: " + repr(name))
+
+    def _read_column(self, field, column, count):
+        self._fileobj.seek(column['offset'])
+        payload = self._fileobj.read(column['length'])
+        encoding = column['encoding']
+        if encoding == 'delta':
+            typecode = strided.array_typecode(field.symbol, field.size)
+            return array.array(typecode, _decode_delta(payload, count))
+        if encoding == 'rle':
+            payload = _decode_rle(payload, field.size)
+        elif encoding == 'dict':
+            payload = _decode_dict(payload, field.size, count)
+        elif encoding != 'raw':
+            raise ValueError("Unknown column encoding: " + repr(encoding))
+        return strided.column(memoryview(payload), field._replace(offset=0),
+                              self._struct.byteorder, field.size, count)
@@ -0,0 +1,198 @@
+import bz2
+import lzma
+import time
+import zlib
+from collections import namedtuple
+
+
+class _ZlibDecompressor:
+    """
+    zlib.decompressobj with interface of bz2.BZ2Decompressor,
+    accepts gzip and zlib streams
+    """
+    def __init__(self):
+        self._decompressor = zlib.decompressobj(zlib.MAX_WBITS | 32)
+
+    @property
+    def eof(self):
+        return self._decompressor.eof
+
+    @property
+    def unused_data(self):
+        return self._decompressor.unused_data
+
+    @property
+    def needs_input(self):
+        return not self._decompressor.unconsumed_tail
+
+    def decompress(self, data, max_length=-1):
+        data = self._decompressor.unconsumed_tail + data
+        return self._decompressor.decompress(data, max(max_length, 0))
+
+
+_codecs = {
+    'gzip': _ZlibDecompressor,
+    'zlib': _ZlibDecompressor,
+    'bz2': bz2.BZ2Decompressor,
+    'xz': lzma.LZMADecompressor,
+}
+
+_magics = {
+    b'\x1f\x8b': 'gzip',
+    b'BZh': 'bz2',
+    b'\xfd7zXZ\x00': 'xz',
+}
+
+
+def register_codec(name, factory, magic=None):
+    """
+    Registers decompressor for CompressedRecordReader
+    :param name: codec name
+    :param factory: func without arguments that returns decompressor
+    with interface of bz2.BZ2Decompressor: decompress(data, max_length),
+    eof, needs_input and unused_data
+    :param magic: bytes at the start of stream for codec detection
+    """
+    _codecs[name] = factory
+    if magic:
+        _magics[magic] = name
+
+
+def _detect_codec(data):
+    for magic, name in _magics.items():
+        if data.startswith(magic):
+            return name
+    raise ValueError("Unknown compression format")
+
+
+class ReaderStats(namedtuple('ReaderStats', ['compressed_bytes',
+                                             'decompressed_bytes',
+                                             'records', 'seconds'])):
+    @property
+    def throughput(self):
+        """
+        Decompressed bytes per second
+        """
+        return self.decompressed_bytes / self.seconds if self.seconds else 0.0
+
+    @property
+    def records_per_second(self):
+        return self.records / self.seconds if self.seconds else 0.0
+
+
+class CompressedRecordReader:
+    """
+    Reads records of FormattedStruct from compressed stream.
+    Stream is decompressed by chunks, all whole records of a chunk
+    are decoded at once, incomplete record is carried over to next chunk.
+    """
+    def __init__(self, formatted_struct, fileobj, codec=None,
+                 chunk_size=1 << 20):
+        """
+        :param formatted_struct: FormattedStruct of records
+        :param fileobj: binary file object or path
+        :param codec: 'gzip', 'zlib', 'bz2', 'xz' or registered codec,
+        detected by stream header if not specified
+        :param chunk_size: max size of decompressed chunk
+        and size of compressed reads
+        """
+        if codec is not None and codec not in _codecs:
+            raise ValueError("Unknown codec: " + repr(codec))
+        if chunk_size < formatted_struct.size:
+            raise ValueError("Chunk size should not be less than record size")
+        self._struct = formatted_struct
+        self._fileobj = fileobj
+        self._codec = codec
+        self._chunk_size = chunk_size
+        self._compressed_bytes = 0
+        self._decompressed_bytes = 0
+        self._records = 0
+        self._started = None
+        self._finished = None
+
+    @property
+    def stats(self):
+        """
+        :rtype: ReaderStats
+        """
+        if self._started is None:
+            seconds = 0.0
+        else:
+            seconds = (self._finished or time.perf_counter()) - self._started
+        return ReaderStats(self._compressed_bytes, self._decompressed_bytes,
+                           self._records, seconds)
+
+    def __iter__(self):
+        for chunk in self._chunks():
+            yield from self._struct.iter_unpack(chunk)
+
+    def iter_batches(self):
+        """
+        Decodes records by chunks
+        :return: iterator of RecordBatch
+        """
+        for chunk in self._chunks():
+            yield self._struct.unpack_batch(chunk)
+
+    def _chunks(self):
+        if isinstance(self._fileobj, str):
+            with open(self._fileobj, 'rb') as fileobj:
+                yield from self._decompressed_chunks(fileobj)
+        else:
+            yield from self._decompressed_chunks(self._fileobj)
+
+    def _decompressed_chunks(self, fileobj):
+        self._started = time.perf_counter()
+        size = self._struct.size
+        buffer = bytearray()
+        data = self._read(fileobj)
+        if self._codec is None:
+            # short reads or small chunk size can split the magic
+            header_size = max(map(len, _magics))
+            while data and len(data) < header_size:
+                more = self._read(fileobj)
+                if not more:
+                    break
+                data += more
+            if not data:
+                self._finished = time.perf_counter()
+                return
+        factory = _codecs[self._codec or _detect_codec(data)]
+        decompressor = factory()
+        started = False
+        while True:
+            if decompressor.eof:
+                data = decompressor.unused_data + data
+                decompressor = factory()
+                started = False
+            if decompressor.needs_input:
+                if not data:
+                    data = self._read(fileobj)
+                    if not data:
+                        break
+                started = True
+                chunk = decompressor.decompress(data, self._chunk_size)
+                data = b''
+            else:
+                chunk = decompressor.decompress(b'', self._chunk_size)
+            self._decompressed_bytes += len(chunk)
+            buffer += chunk
+            whole = len(buffer) - len(buffer) % size
+            if not whole:
+                continue
+            self._records += whole // size
+            with memoryview(buffer)[:whole] as view:
+                yield view
+            del buffer[:whole]
+        self._finished = time.perf_counter()
+        if started and not decompressor.eof:
+            raise EOFError("Compressed stream ended before "
+                           "the end-of-stream marker was reached")
+        if buffer:
+            raise ValueError("Stream ended with incomplete record of "
+                             "{} bytes".format(len(buffer)))
+
+    def _read(self, fileobj):
+        data = fileobj.read(self._chunk_size)
+        self._compressed_bytes += len(data)
+        return data
@@ -0,0 +1,81 @@
+import array
+
+
+class RecordBatch:
+    """
+    Decoded records stored by columns.
+    Numeric fields are kept in arrays, rows (namedtuples)
+    are created only on access.
+    """
+    def __init__(self, nt, columns):
+        self._nt = nt
+        self._columns = list(columns)
+
+    @property
+    def namedtuple(self):
+        return self._nt
+
+    @property
+    def columns(self):
+        return self._columns
+
+    def column(self, name):
+        """
+        Values of field in all records
+        :param name: field name
+        :return: array or list
+        """
+        return self._columns[self._nt._fields.index(name)]
+
+    def __len__(self):
+        if not self._columns:
+            return 0
+        return len(self._columns[0])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return RecordBatch(self._nt,
+                               [column[index] for column in self._columns])
+        return self._nt._make([column[index] for column in self._columns])
+
+    def __iter__(self):
+        return map(self._nt._make, zip(*self._columns))
+
+    def take(self, indices):
+        """
+        Creates batch of records with specified indices
+        :param indices: iterable of record indices
+        :rtype: RecordBatch
+        """
+        indices = list(indices)
+        return RecordBatch(self._nt,
+                           [_take(column, indices)
+                            for column in self._columns])
+
+    def filter(self, predicate, field=None):
+        """
+        Creates batch of records matched by predicate
+        :param predicate: func that receives a record,
+        or a value of field if it is specified
+        :param field: field name
+        :rtype: RecordBatch
+        """
+        if field is None:
+            items = self
+        else:
+            items = self.column(field)
+        return self.take(i for i, item in enumerate(items)
+                         if predicate(item))
+
+    def to_pylist(self):
+        """
+        :return: list of namedtuples
+        """
+        return list(self)
+
+
+def _take(column, indices):
+    values = [column[i] for i in indices]
+    if isinstance(column, array.array):
+        return array.array(column.typecode, values)
+    return values
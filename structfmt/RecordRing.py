@@ -0,0 +1,172 @@
+import os
+import sys
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+# header is array of uint64: head, capacity and record size are written
+# by producer, tail by consumer, in separate cache lines
+_header_size = 128
+_head = 0
+_capacity = 1
+_record_size = 2
+_tail = 8
+
+# names of segments created by this process
+_created = set()
+
+
+class RecordRing:
+    """
+    Single producer, single consumer ring buffer of FormattedStruct records
+    in shared memory. Records are packed directly into slots
+    and unpacked by batches, head and tail counters are stored
+    in the segment.
+    """
+    def __init__(self, formatted_struct, shm, owner):
+        self._struct = formatted_struct
+        self._shm = shm
+        self._owner = owner
+        self._counters = shm.buf[:_header_size].cast('Q')
+        self._size = formatted_struct.size
+        if owner:
+            self._counters[_record_size] = self._size
+        elif self._counters[_record_size] != self._size:
+            record_size = self._counters[_record_size]
+            self.close()
+            raise ValueError("Record size of ring is {}, but struct size "
+                             "is {}".format(record_size, self._size))
+        self._cap = self._counters[_capacity]
+
+    @classmethod
+    def create(cls, formatted_struct, capacity, name=None):
+        """
+        Creates ring in new shared memory segment
+        :param formatted_struct: FormattedStruct of records
+        :param capacity: count of slots
+        :param name: name of segment, generated if not specified
+        :rtype: RecordRing
+        """
+        if shared_memory is None:
+            raise RuntimeError("multiprocessing.shared_memory "
+                               "is not available")
+        if capacity <= 0:
+            raise ValueError("Incorrect capacity: " + str(capacity))
+        shm = shared_memory.SharedMemory(
+            name, create=True,
+            size=_header_size + capacity * formatted_struct.size)
+        shm.buf[:_header_size] = bytes(_header_size)
+        shm.buf[:_header_size].cast('Q')[_capacity] = capacity
+        _created.add(shm.name)
+        return cls(formatted_struct, shm, True)
+
+    @classmethod
+    def attach(cls, formatted_struct, name):
+        """
+        Attaches to ring created by another process
+        :param formatted_struct: FormattedStruct of records
+        :param name: name of segment
+        :rtype: RecordRing
+        """
+        if shared_memory is None:
+            raise RuntimeError("multiprocessing.shared_memory "
+                               "is not available")
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name, track=False)
+        else:
+            shm = shared_memory.SharedMemory(name)
+            # resource tracker of attaching process would unlink segment
+            # at exit, only creator should destroy it
+            if os.name == 'posix' and shm.name not in _created:
+                resource_tracker.unregister(shm._name, 'shared_memory')
+        return cls(formatted_struct, shm, False)
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def capacity(self):
+        return self._cap
+
+    def __len__(self):
+        return self._counters[_head] - self._counters[_tail]
+
+    def put(self, *items):
+        """
+        Packs record into free slot, should be called by producer only
+        :return: False if ring is full
+        """
+        head = self._counters[_head]
+        if head - self._counters[_tail] >= self._cap:
+            return False
+        self._struct.pack_into(self._shm.buf, self._offset(head), *items)
+        self._counters[_head] = head + 1
+        return True
+
+    def put_many(self, records):
+        """
+        Packs records into free slots, should be called by producer only
+        :param records: sequence of tuples of values
+        :return: count of packed records
+        """
+        head = self._counters[_head]
+        count = min(len(records),
+                    self._cap - (head - self._counters[_tail]))
+        buf = self._shm.buf
+        for i in range(count):
+            self._struct.pack_into(buf, self._offset(head + i), *records[i])
+        self._counters[_head] = head + count
+        return count
+
+    def get_batch(self, max_count=None):
+        """
+        Unpacks available records, should be called by consumer only
+        :param max_count: max count of records
+        :return: list of namedtuples
+        """
+        tail = self._counters[_tail]
+        count = self._counters[_head] - tail
+        if max_count is not None:
+            count = min(count, max_count)
+        if not count:
+            return []
+        start = self._offset(tail)
+        stop = self._offset(tail + count - 1) + self._size
+        buf = self._shm.buf
+        if stop > start:
+            records = list(self._struct.iter_unpack(buf[start:stop]))
+        else:
+            end = _header_size + self._cap * self._size
+            records = list(self._struct.iter_unpack(buf[start:end]))
+            records += self._struct.iter_unpack(buf[_header_size:stop])
+        self._counters[_tail] = tail + count
+        return records
+
+    def close(self):
+        """
+        Detaches from shared memory segment
+        """
+        self._counters.release()
+        self._shm.close()
+
+    def unlink(self):
+        """
+        Destroys shared memory segment, should be called once
+        after all processes closed the ring
+        """
+        _created.discard(self._shm.name)
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        if self._owner:
+            self.unlink()
+
+    def _offset(self, index):
+        return _header_size + index % self._cap * self._size
@@ -1,5 +1,23 @@
 import struct
 
+_sizes = {}
+
+
+def _size(byteorder, symbol):
+    key = byteorder + symbol
+    size = _sizes.get(key)
+    if size is None:
+        size = _sizes[key] = struct.calcsize(key)
+    return size
+
+
+def _align(offset, byteorder, symbol):
+    if byteorder != '@' or symbol in 'xsp':
+        return offset
+    # '0' count only aligns, so size of 'c0X' is alignment of X
+    alignment = _size('@c0', symbol)
+    return (offset + alignment - 1) // alignment * alignment
+
 
 class StructFormatter:
     def __init__(self):
@@ -11,6 +29,10 @@ class StructFormatter:
     def offset(self):
         return self._offset
 
+    @property
+    def byteorder(self):
+        return self._byteorder
+
     def native_alignment_endian(self):
         """
         Sets native byte order with native fields alignment
@@ -292,7 +314,14 @@ class StructFormatter:
             self._parts.append([symbol, count])
         else:
             self._parts[-1][1] += count
-        self._offset += struct.calcsize(str(count) + symbol)
+        self._offset = _align(self._offset, self._byteorder, symbol)
+        if symbol in 'xsp':
+            self._offset += count
+        elif symbol in 'nNP' and self._byteorder != '@':
+            # no standard size, struct rejects the format when it is built
+            self._offset += count * _size('@', symbol)
+        else:
+            self._offset += count * _size(self._byteorder, symbol)
         return self
 
     @staticmethod
@@ -308,3 +337,26 @@ class StructFormatter:
 
     def build_struct(self):
         return struct.Struct(self.build_format_string())
+
+    def build_layout(self):
+        """
+        Builds placement of every packed value
+        :return: list of (symbol, offset, size) in packing order,
+        skipped bytes are not included
+        """
+        layout = []
+        offset = 0
+        for symbol, count in self._parts:
+            if symbol == 'x':
+                offset += count
+                continue
+            offset = _align(offset, self._byteorder, symbol)
+            if symbol in 'sp':
+                layout.append((symbol, offset, count))
+                offset += count
+                continue
+            size = _size(self._byteorder, symbol)
+            for _ in range(count):
+                layout.append((symbol, offset, size))
+                offset += size
+        return layout
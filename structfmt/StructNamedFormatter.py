@@ -1,14 +1,45 @@
+import keyword
 import struct
 from .StructFormatter import StructFormatter
+from . import ctypesfmt
 
 top_package = __import__(__name__.split('.')[0])
 
+# format symbols of field methods, used by from_spec
+_symbols = {
+    'bool': '?',
+    'byte': 'c',
+    'int8': 'b',
+    'uint8': 'B',
+    'int16': 'h',
+    'uint16': 'H',
+    'int32': 'i',
+    'uint32': 'I',
+    'int64': 'q',
+    'uint64': 'Q',
+    'long': 'l',
+    'ulong': 'L',
+    'ssize_t': 'n',
+    'size_t': 'N',
+    'half_precision': 'e',
+    'float': 'f',
+    'double': 'd',
+    'bytes': 's',
+    'pascal_bytes': 'p',
+    'native_pointer': 'P',
+    'skip_bytes': 'x',
+}
+
 
 class StructNamedFormatter:
     def __init__(self, name):
         self._name = name
         self._fields = []
+        self._field_names = set()
         self._mappers = {}
+        self._batch_mappers = {}
+        self._encoders = {}
+        self._cacheable = True
         self._formatter = StructFormatter()
 
         self._last_added_count = 0
@@ -76,248 +107,317 @@ class StructNamedFormatter:
         self._formatter.skip_to_offset(offset)
         return self
 
-    def bool(self, *fields, mapper=None):
+    def impure_mappers(self):
+        """
+        Marks mappers as impure, so unpacked records
+        are never taken from cache of FormattedStruct
+        :rtype: StructNamedFormatter
+        """
+        self._cacheable = False
+        return self
+
+    def bool(self, *fields, mapper=None, batch_mapper=None,
+             encoder=None):
         """
         Boolean value
         c type: bool
         python type: bool
         :param mapper: mapper func
+        :param batch_mapper: mapper func for list of values
+        :param encoder: func that converts value back for packing
         :rtype: StructNamedFormatter
         """
-        self._add_fields(fields, mapper)
+        self._add_fields(fields, mapper, batch_mapper, encoder)
         self._formatter.bool(len(fields))
         return self
 
-    def byte(self, *fields, mapper=None):
+    def byte(self, *fields, mapper=None, batch_mapper=None,
+             encoder=None):
         """
         Char field
         c type: char
         python type: bytes of length 1
         :param mapper: mapper func
+        :param batch_mapper: mapper func for list of values
+        :param encoder: func that converts value back for packing
         :rtype: StructNamedFormatter
         """
-        self._add_fields(fields, mapper)
+        self._add_fields(fields, mapper, batch_mapper, encoder)
         self._formatter.byte(len(fields))
         return self
 
-    def int8(self, *fields, mapper=None):
+    def int8(self, *fields, mapper=None, batch_mapper=None,
+             encoder=None):
         """
         1 byte integer field
         c type: signed char
         python type: int
         :param mapper: mapper func
+        :param batch_mapper: mapper func for list of values
+        :param encoder: func that converts value back for packing
         :rtype: StructNamedFormatter
         """
-        self._add_fields(fields, mapper)
+        self._add_fields(fields, mapper, batch_mapper, encoder)
         self._formatter.int8(len(fields))
         return self
 
-    def uint8(self, *fields, mapper=None):
+    def uint8(self, *fields, mapper=None, batch_mapper=None,
+              encoder=None):
         """
         1 byte unsigned integer field
         c type: unsigned char
         python type: int
         :param mapper: mapper func
+        :param batch_mapper: mapper func for list of values
+        :param encoder: func that converts value back for packing
         :rtype: StructNamedFormatter
         """
-        self._add_fields(fields, mapper)
+        self._add_fields(fields, mapper, batch_mapper, encoder)
         self._formatter.uint8(len(fields))
         return self
 
-    def int16(self, *fields, mapper=None):
+    def int16(self, *fields, mapper=None, batch_mapper=None,
+              encoder=None):
         """
         2 bytes integer field
         c type: short
         python type: int
         :param mapper: mapper func
+        :param batch_mapper: mapper func for list of values
+        :param encoder: func that converts value back for packing
         :rtype: StructNamedFormatter
         """
-        self._add_fields(fields, mapper)
+        self._add_fields(fields, mapper, batch_mapper, encoder)
         self._formatter.int16(len(fields))
         return self
 
-    def uint16(self, *fields, mapper=None):
+    def uint16(self, *fields, mapper=None, batch_mapper=None,
+               encoder=None):
         """
         2 bytes unsigned integer field
         c type: unsigned short
         python type: int
         :param mapper: mapper func
+        :param batch_mapper: mapper func for list of values
+        :param encoder: func that converts value back for packing
         :rtype: StructNamedFormatter
         """
-        self._add_fields(fields, mapper)
+        self._add_fields(fields, mapper, batch_mapper, encoder)
         self._formatter.uint16(len(fields))
         return self
 
-    def int32(self, *fields, mapper=None):
+    def int32(self, *fields, mapper=None, batch_mapper=None,
+              encoder=None):
         """
         4 bytes integer field
         c type: int
         python type: int
         :param mapper: mapper func
+        :param batch_mapper: mapper func for list of values
+        :param encoder: func that converts value back for packing
         :rtype: StructNamedFormatter
         """
-        self._add_fields(fields, mapper)
+        self._add_fields(fields, mapper, batch_mapper, encoder)
         self._formatter.int32(len(fields))
         return self
 
-    def uint32(self, *fields, mapper=None):
+    def uint32(self, *fields, mapper=None, batch_mapper=None,
+               encoder=None):
         """
         4 bytes unsigned integer field
         c type: unsigned int
         python type: int
         :param mapper: mapper func
+        :param batch_mapper: mapper func for list of values
+        :param encoder: func that converts value back for packing
         :rtype: StructNamedFormatter
         """
-        self._add_fields(fields, mapper)
+        self._add_fields(fields, mapper, batch_mapper, encoder)
         self._formatter.uint32(len(fields))
         return self
 
-    def int64(self, *fields, mapper=None):
+    def int64(self, *fields, mapper=None, batch_mapper=None,
+              encoder=None):
         """
         8 bytes integer field
         c type: long long
         python type: int
         :param mapper: mapper func
+        :param batch_mapper: mapper func for list of values
+        :param encoder: func that converts value back for packing
         :rtype: StructNamedFormatter
         """
-        self._add_fields(fields, mapper)
+        self._add_fields(fields, mapper, batch_mapper, encoder)
         self._formatter.int64(len(fields))
         return self
 
-    def uint64(self, *fields, mapper=None):
+    def uint64(self, *fields, mapper=None, batch_mapper=None,
+               encoder=None):
         """
         4 bytes unsigned integer field
         c type: unsigned long long
         python type: int
         :param mapper: mapper func
+        :param batch_mapper: mapper func for list of values
+        :param encoder: func that converts value back for packing
         :rtype: StructNamedFormatter
         """
-        self._add_fields(fields, mapper)
+        self._add_fields(fields, mapper, batch_mapper, encoder)
         self._formatter.uint64(len(fields))
         return self
 
-    def long(self, *fields, mapper=None):
+    def long(self, *fields, mapper=None, batch_mapper=None,
+             encoder=None):
         """
         4 bytes integer field
         c type: long
         python type: int
         :param mapper: mapper func
+        :param batch_mapper: mapper func for list of values
+        :param encoder: func that converts value back for packing
         :rtype: StructNamedFormatter
         """
-        self._add_fields(fields, mapper)
+        self._add_fields(fields, mapper, batch_mapper, encoder)
         self._formatter.long(len(fields))
         return self
 
-    def ulong(self, *fields, mapper=None):
+    def ulong(self, *fields, mapper=None, batch_mapper=None,
+              encoder=None):
         """
         4 bytes unsigned integer field
         c type: long
         python type: int
         :param mapper: mapper func
+        :param batch_mapper: mapper func for list of values
+        :param encoder: func that converts value back for packing
         :rtype: StructNamedFormatter
         """
-        self._add_fields(fields, mapper)
+        self._add_fields(fields, mapper, batch_mapper, encoder)
         self._formatter.ulong(len(fields))
         return self
 
-    def ssize_t(self, *fields, mapper=None):
+    def ssize_t(self, *fields, mapper=None, batch_mapper=None,
+                encoder=None):
         """
         Platform specified signed integer field
         c type: ssize_t
         python type: int
         :param mapper: mapper func
+        :param batch_mapper: mapper func for list of values
+        :param encoder: func that converts value back for packing
         :rtype: StructNamedFormatter
         """
-        self._add_fields(fields, mapper)
+        self._add_fields(fields, mapper, batch_mapper, encoder)
         self._formatter.ssize_t(len(fields))
         return self
 
-    def size_t(self, *fields, mapper=None):
+    def size_t(self, *fields, mapper=None, batch_mapper=None,
+               encoder=None):
         """
         Platform specified unsigned integer field
         c type: size_t
         python type: int
         :param mapper: mapper func
+        :param batch_mapper: mapper func for list of values
+        :param encoder: func that converts value back for packing
         :rtype: StructNamedFormatter
         """
-        self._add_fields(fields, mapper)
+        self._add_fields(fields, mapper, batch_mapper, encoder)
         self._formatter.size_t(len(fields))
         return self
 
-    def half_precision(self, *fields, mapper=None):
+    def half_precision(self, *fields, mapper=None, batch_mapper=None,
+                       encoder=None):
         """
         2 bytes half precision IEEE754-2008 floating point number field
         c type: half (nonstandard)
         python type: float
         :param mapper: mapper func
+        :param batch_mapper: mapper func for list of values
+        :param encoder: func that converts value back for packing
         :rtype: StructNamedFormatter
         """
-        self._add_fields(fields, mapper)
+        self._add_fields(fields, mapper, batch_mapper, encoder)
         self._formatter.half_precision(len(fields))
         return self
 
-    def float(self, *fields, mapper=None):
+    def float(self, *fields, mapper=None, batch_mapper=None,
+              encoder=None):
         """
         4 bytes single precision IEEE754 floating point number field
         c type: float
         python type: float
         :param mapper: mapper func
+        :param batch_mapper: mapper func for list of values
+        :param encoder: func that converts value back for packing
         :rtype: StructNamedFormatter
         """
-        self._add_fields(fields, mapper)
+        self._add_fields(fields, mapper, batch_mapper, encoder)
         self._formatter.float(len(fields))
         return self
 
-    def double(self, *fields, mapper=None):
+    def double(self, *fields, mapper=None, batch_mapper=None,
+               encoder=None):
         """
         8 bytes double precision IEEE754 floating point number field
         c type: double
         python type: float
         :param mapper: mapper func
+        :param batch_mapper: mapper func for list of values
+        :param encoder: func that converts value back for packing
         :rtype: StructNamedFormatter
         """
-        self._add_fields(fields, mapper)
+        self._add_fields(fields, mapper, batch_mapper, encoder)
         self._formatter.double(len(fields))
         return self
 
-    def bytes(self, field, length, mapper=None):
+    def bytes(self, field, length, mapper=None, batch_mapper=None,
+              encoder=None):
         """
         Bytes sequence of specified length
         c type: char[]
         python type: bytes
         :param mapper: mapper func
+        :param batch_mapper: mapper func for list of values
+        :param encoder: func that converts value back for packing
         :param length: bytes sequence length
         :param field: field name
         :rtype: StructNamedFormatter
         """
-        self._add_fields([field], mapper)
+        self._add_fields([field], mapper, batch_mapper, encoder)
         self._formatter.bytes(length)
         return self
 
-    def pascal_bytes(self, field, max_length=1, mapper=None):
+    def pascal_bytes(self, field, max_length=1, mapper=None,
+                     batch_mapper=None, encoder=None):
         """
         Bytes sequence. Length specified in first byte,
         so, max_length is not greater than min(max_length - 1, 255)
         c type: char[]
         python type: bytes
         :param mapper: mapper func
+        :param batch_mapper: mapper func for list of values
+        :param encoder: func that converts value back for packing
         :param max_length: max length of bytes sequence
         :param field: field name
         :rtype: StructNamedFormatter
         """
-        self._add_fields([field], mapper)
+        self._add_fields([field], mapper, batch_mapper, encoder)
         self._formatter.pascal_bytes(max_length)
         return self
 
-    def native_pointer(self, *fields, mapper=None):
+    def native_pointer(self, *fields, mapper=None, batch_mapper=None,
+                       encoder=None):
         """
         Platform specified pointer integer field
         c type: (void*)
         python type: int
         :param mapper: mapper func
+        :param batch_mapper: mapper func for list of values
+        :param encoder: func that converts value back for packing
         :rtype: StructNamedFormatter
         """
-        self._add_fields(fields, mapper)
+        self._add_fields(fields, mapper, batch_mapper, encoder)
         self._formatter.native_pointer(len(fields))
         return self
 
@@ -333,16 +433,163 @@ class StructNamedFormatter:
             self._mappers[field] = mapper_func
         return self
 
-    def _add_fields(self, fields, mapper=None):
+    def _with_batch_mapper(self, mapper_func, *fields):
+        """
+        :param mapper_func: func that maps list
+        of values from internal view
+        :rtype: StructNamedFormatter
+        """
+        if not fields:
+            fields = self._fields[-self._last_added_count:]
+        for field in fields:
+            self._batch_mappers[field] = mapper_func
+        return self
+
+    def _with_encoder(self, encoder_func, *fields):
+        """
+        :param encoder_func: func that converts
+        values back to internal view
+        :rtype: StructNamedFormatter
+        """
+        if not fields:
+            fields = self._fields[-self._last_added_count:]
+        for field in fields:
+            self._encoders[field] = encoder_func
+        return self
+
+    def _add_fields(self, fields, mapper=None, batch_mapper=None,
+                    encoder=None):
+        if mapper and batch_mapper:
+            raise ValueError("Only one of mapper and batch_mapper "
+                             "can be specified")
+        names = set(fields)
+        if len(names) != len(fields) or names & self._field_names:
+            raise ValueError("Duplicate field name: " +
+                             repr(self._find_duplicate(fields)))
+        self._field_names |= names
         prev_len = len(self._fields)
         self._fields += fields
         self._last_added_count = len(self._fields) - prev_len
         if mapper:
             self._with_mapper(mapper)
+        if batch_mapper:
+            self._with_batch_mapper(batch_mapper)
+        if encoder:
+            self._with_encoder(encoder)
+
+    def _find_duplicate(self, fields):
+        names = set(self._field_names)
+        for field in fields:
+            if field in names:
+                return field
+            names.add(field)
+
+    def from_spec(self, spec):
+        """
+        Adds many fields at once
+        :param spec: list of (name, type, count_or_len, mapper, encoder,
+        batch_mapper) tuples, or dict of name: (type, count_or_len, mapper,
+        encoder, batch_mapper). Type is a name of field method,
+        other items are optional, only one of mapper and batch_mapper
+        can be specified. count_or_len is length for bytes and pascal_bytes,
+        count of bytes for skip_bytes (name should be None),
+        and should be 1 for other types.
+        :rtype: StructNamedFormatter
+        """
+        if isinstance(spec, dict):
+            spec = [(name,) + (value if isinstance(value, tuple)
+                               else (value,))
+                    for name, value in spec.items()]
+        fields = []
+        parts = []
+        mappers = {}
+        batch_mappers = {}
+        encoders = {}
+        names = set(self._field_names)
+        for index, entry in enumerate(spec):
+            entry = tuple(entry)
+            if not 2 <= len(entry) <= 6:
+                raise ValueError("Field spec #{}: expected (name, type, "
+                                 "count_or_len, mapper, encoder, "
+                                 "batch_mapper), got {!r}"
+                                 .format(index, entry))
+            name, type_name, count, mapper, encoder, batch_mapper = \
+                entry + (None,) * (6 - len(entry))
+            symbol = _symbols.get(type_name)
+            error = self._check_spec_entry(name, symbol, count, mapper,
+                                           batch_mapper, encoder, names,
+                                           self._formatter.byteorder)
+            if error:
+                raise ValueError("Field spec #{} {!r}: {}"
+                                 .format(index, name, error))
+            if count is None:
+                count = 1
+            parts.append((symbol, count))
+            if symbol == 'x':
+                continue
+            names.add(name)
+            fields.append(name)
+            if mapper is not None:
+                mappers[name] = mapper
+            if batch_mapper is not None:
+                batch_mappers[name] = batch_mapper
+            if encoder is not None:
+                encoders[name] = encoder
+
+        for symbol, count in parts:
+            self._formatter._add(symbol, count)
+        self._fields += fields
+        self._field_names = names
+        self._mappers.update(mappers)
+        self._batch_mappers.update(batch_mappers)
+        self._encoders.update(encoders)
+        self._last_added_count = len(fields)
+        return self
+
+    @staticmethod
+    def _check_spec_entry(name, symbol, count, mapper, batch_mapper, encoder,
+                          names, byteorder):
+        if symbol is None:
+            return "unknown type"
+        if symbol in 'nNP' and byteorder != '@':
+            return "type is available only with native alignment"
+        if count is None:
+            if symbol == 's':
+                return "length of bytes is required"
+        elif not isinstance(count, int) or count < 0:
+            return "incorrect count or length " + repr(count)
+        if symbol == 'x':
+            if (name is not None or mapper is not None or
+                    batch_mapper is not None or encoder is not None):
+                return "skipped bytes can't have name, mappers or encoder"
+            return None
+        if mapper is not None and batch_mapper is not None:
+            return "only one of mapper and batch_mapper can be specified"
+        if symbol == 'p' and count == 0:
+            return "incorrect length of pascal string"
+        if symbol not in 'sp' and count not in (None, 1):
+            return "count of field should be 1"
+        if (not isinstance(name, str) or not name.isidentifier() or
+                keyword.iskeyword(name) or name.startswith('_')):
+            return "name should be an identifier not starting with '_'"
+        if name in names:
+            return "duplicate field name"
+        return None
 
     def build_format_string(self):
         return self._formatter.build_format_string()
 
+    def build_ctypes_structure(self):
+        """
+        Creates ctypes.Structure subclass with the same fields layout
+        :rtype: type
+        """
+        fields = [top_package.Field(name, *item) for name, item
+                  in zip(self._fields, self._formatter.build_layout())]
+        return ctypesfmt.build_structure(self._name, fields,
+                                         self._formatter.byteorder,
+                                         self.offset)
+
     def build_formatted_struct(self):
         """
 
@@ -350,4 +597,8 @@ class StructNamedFormatter:
         """
         s = struct.Struct(self.build_format_string())
         nt = top_package.create_nt(self._name, self._fields)
-        return top_package.FormattedStruct(s, nt, self._mappers)
+        return top_package.FormattedStruct(s, nt, self._mappers,
+                                           self._formatter.build_layout(),
+                                           self._batch_mappers,
+                                           self._encoders,
+                                           self._cacheable)
@@ -1,15 +1,72 @@
-from collections import namedtuple
-from .structfmt import struct_format, struct_named_format
+import ctypes
+from collections import Counter, namedtuple
+from collections.abc import Mapping
+from functools import lru_cache
+from operator import attrgetter, itemgetter
+from .structfmt import struct_format, struct_named_format, \
+    struct_named_format_from_ctypes
+from .RecordBatch import RecordBatch
+from .RecordRing import RecordRing
+from .ColumnarFile import ColumnarReader, ColumnarWriter
+from .CompressedRecordReader import CompressedRecordReader, \
+    register_codec
+from . import ctypesfmt, strided
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 __all__ = ['structfmt.struct_format',
            'structfmt.struct_named_format']
 
+Field = namedtuple('Field', ['name', 'symbol', 'offset', 'size'])
+
+RecordChange = namedtuple('RecordChange', ['index', 'old', 'new', 'fields'])
+
+
+class CacheInfo(namedtuple('CacheInfo', ['hits', 'misses',
+                                         'maxsize', 'currsize'])):
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+# fields which bytes don't depend on byte order
+_unordered_symbols = 'xcbB?sp'
+
+_aggregate_ops = ('sum', 'min', 'max', 'count', 'hist')
+
+# count of records compared at once by diff before comparing one by one
+_diff_block = 256
+
 
 class FormattedStruct:
-    def __init__(self, struct, nt, mappers):
+    # count of records passed to batch mappers at once
+    batch_size = 1024
+
+    def __init__(self, struct, nt, mappers, layout, batch_mappers=None,
+                 encoders=None, cacheable=True):
         self._struct = struct
         self._nt = nt
         self._mappers = mappers
+        self._batch_mappers = batch_mappers or {}
+        self._mapped = bool(mappers or self._batch_mappers)
+        encoders = encoders or {}
+        self._encoders = [(index, encoders[name])
+                          for index, name in enumerate(nt._fields)
+                          if name in encoders]
+        self._get_items = _getter(itemgetter, nt._fields)
+        self._get_attrs = _getter(attrgetter, nt._fields)
+        self._cacheable = cacheable
+        self._cache = None
+        self._fields = tuple(Field(name, *item)
+                             for name, item in zip(nt._fields, layout))
+        fmt = struct.format
+        self._byteorder = fmt[0] if fmt and fmt[0] in '@=<>!' else '@'
+        self._ctypes_structure = None
+        self._ctypes_overlay = None
 
     @property
     def namedtuple(self):
@@ -19,14 +76,103 @@ class FormattedStruct:
     def size(self):
         return self._struct.size
 
+    @property
+    def format(self):
+        return self._struct.format
+
+    @property
+    def fields(self):
+        """
+        Placement of fields in record
+        :rtype: tuple of Field
+        """
+        return self._fields
+
+    @property
+    def byteorder(self):
+        return self._byteorder
+
+    @property
+    def ctypes_structure(self):
+        """
+        ctypes.Structure subclass with the same fields layout
+        :rtype: type
+        """
+        if self._ctypes_structure is None:
+            self._ctypes_structure = ctypesfmt.build_structure(
+                self._nt.__name__, self._fields, self._byteorder, self.size)
+        return self._ctypes_structure
+
     def pack(self, *items):
         return self._struct.pack(*items)
 
+    def pack_record(self, record):
+        """
+        Packs fields of mapping or object, encoders are applied
+        :param record: mapping or object with attributes named as fields,
+        e.g. namedtuple returned by unpack
+        :rtype: bytes
+        """
+        if type(record) is dict or isinstance(record, Mapping):
+            items = self._get_items(record)
+        else:
+            items = self._get_attrs(record)
+        if not self._encoders:
+            return self._struct.pack(*items)
+        items = list(items)
+        for index, encoder in self._encoders:
+            items[index] = encoder(items[index])
+        return self._struct.pack(*items)
+
+    def pack_many_records(self, records):
+        """
+        Packs iterable of mappings or objects, see pack_record
+        :rtype: bytes
+        """
+        return b''.join(map(self.pack_record, records))
+
     def pack_into(self, buffer, offset, *items):
-        return self._struct.pack(buffer, offset, *items)
+        return self._struct.pack_into(buffer, offset, *items)
+
+    def enable_cache(self, maxsize=1024):
+        """
+        Enables LRU cache of unpacked records keyed by record bytes,
+        identical records are unpacked to the same namedtuple.
+        Has no effect if struct mappers are marked as impure.
+        iter_unpack of struct with batch mappers doesn't use cache,
+        so batch mappers still receive whole batches.
+        :param maxsize: max count of cached records
+        :rtype: FormattedStruct
+        """
+        if not isinstance(maxsize, int) or maxsize <= 0:
+            raise ValueError("Incorrect cache size: " + repr(maxsize))
+        if self._cacheable:
+            self._cache = lru_cache(maxsize)(self._unpack)
+        return self
+
+    def disable_cache(self):
+        """
+        :rtype: FormattedStruct
+        """
+        self._cache = None
+        return self
+
+    def cache_info(self):
+        """
+        Statistics of unpacked records cache
+        :return: CacheInfo or None if cache is disabled
+        """
+        if self._cache is None:
+            return None
+        return CacheInfo(*self._cache.cache_info())
 
     def unpack(self, buffer):
-        if not self._mappers:
+        if self._cache is not None:
+            return self._cache(bytes(buffer))
+        return self._unpack(buffer)
+
+    def _unpack(self, buffer):
+        if not self._mapped:
             return self._nt(*self._struct.unpack(buffer))
         return self._nt._make(
             map(self._conv,
@@ -36,7 +182,15 @@ class FormattedStruct:
     def unpack_from(self, buffer, offset=0):
         # it can be reimplemented better with iter_unpack
         # but that is Python 3.4 feature
-        if not self._mappers:
+        if self._cache is not None:
+            view = memoryview(buffer).cast('B')
+            # negative offset is counted from the end, as in struct
+            start = offset + len(view) if offset < 0 else offset
+            if start < 0 or len(view) - start < self.size:
+                # raises struct.error of incorrect offset
+                self._struct.unpack_from(buffer, offset)
+            return self._cache(bytes(view[start:start + self.size]))
+        if not self._mapped:
             return self._nt(*self._struct.unpack_from(buffer, offset))
         return self._nt._make(
             map(self._conv,
@@ -44,18 +198,284 @@ class FormattedStruct:
                     self._struct.unpack_from(buffer, offset))))
 
     def iter_unpack(self, buffer):
-        if not self._mappers:
-            return self._struct.iter_unpack(buffer)
-        return map(self._conv,
-                   zip(self._nt._fields,
-                       self._struct.iter_unpack(buffer)))
+        if self._cache is not None and not self._batch_mappers:
+            view, count = strided.records_view(buffer, self.size)
+            return map(self._cache,
+                       (bytes(view[start:start + self.size])
+                        for start in range(0, len(view), self.size)))
+        if not self._mapped:
+            return map(self._nt._make, self._struct.iter_unpack(buffer))
+        if not self._batch_mappers:
+            return map(self._make, self._struct.iter_unpack(buffer))
+        return self._iter_unpack_batches(buffer)
+
+    def unpack_batch(self, buffer):
+        """
+        Unpacks all records of buffer by columns
+        :param buffer: buffer of records
+        :rtype: RecordBatch
+        """
+        return RecordBatch(self._nt, self._map_columns(
+            self._raw_columns(buffer)))
+
+    def ctypes_view(self, buffer, offset=0):
+        """
+        Maps record of writable buffer to ctypes structure without copying,
+        changes of fields are written directly to the buffer
+        :param buffer: writable buffer, e.g. bytearray, mmap
+        or shared memory
+        :param offset: offset of record in buffer
+        :return: instance of ctypes structure with fields at record offsets
+        and sizeof equal to size, it is ctypes_structure
+        unless native alignment adds trailing padding
+        """
+        if self._ctypes_overlay is None:
+            self._ctypes_overlay = self.ctypes_structure
+            if ctypes.sizeof(self._ctypes_overlay) != self.size:
+                self._ctypes_overlay = ctypesfmt.build_structure(
+                    self._nt.__name__, self._fields, self._byteorder,
+                    self.size, packed=True)
+        return self._ctypes_overlay.from_buffer(buffer, offset)
+
+    def read_compressed(self, fileobj, codec=None, chunk_size=1 << 20):
+        """
+        Reads records from compressed stream by chunks
+        :param fileobj: binary file object or path
+        :param codec: 'gzip', 'zlib', 'bz2', 'xz' or registered codec,
+        detected by stream header if not specified
+        :param chunk_size: max size of decompressed chunk
+        :rtype: CompressedRecordReader
+        """
+        return CompressedRecordReader(self, fileobj, codec, chunk_size)
+
+    def write_columnar(self, fileobj, chunk_size=65536):
+        """
+        Creates writer of records to chunked columnar file
+        :param fileobj: binary file object or path
+        :param chunk_size: count of records in chunk
+        :rtype: ColumnarWriter
+        """
+        return ColumnarWriter(self, fileobj, chunk_size)
+
+    def read_columnar(self, fileobj):
+        """
+        Opens chunked columnar file of records
+        :param fileobj: seekable binary file object or path
+        :rtype: ColumnarReader
+        """
+        return ColumnarReader(self, fileobj)
+
+    def create_ring(self, capacity, name=None):
+        """
+        Creates shared memory ring buffer of records
+        :param capacity: count of records
+        :param name: name of shared memory segment
+        :rtype: RecordRing
+        """
+        return RecordRing.create(self, capacity, name)
+
+    def attach_ring(self, name):
+        """
+        Attaches to shared memory ring buffer of records
+        :param name: name of shared memory segment
+        :rtype: RecordRing
+        """
+        return RecordRing.attach(self, name)
+
+    def aggregate(self, buffer, field, ops=_aggregate_ops):
+        """
+        Computes statistics of numeric field over buffer of records
+        without unpacking them. Mappers are not applied.
+        :param buffer: buffer of records
+        :param field: field name
+        :param ops: names of statistics: 'sum', 'min', 'max', 'count',
+        'hist' (dict of value: count of records)
+        :return: dict of op: value, min and max are None for empty buffer
+        """
+        unknown = set(ops).difference(_aggregate_ops)
+        if unknown:
+            raise ValueError("Unknown aggregate ops: " +
+                             ', '.join(sorted(unknown)))
+        field = self._field(field)
+        if field.symbol in 'csp':
+            raise ValueError("Field {!r} is not numeric".format(field.name))
+        view, count = strided.records_view(buffer, self.size)
+        # numpy rejects offset beyond the end of empty buffer
+        if numpy is not None and count:
+            items = numpy.ndarray(
+                (count,), _numpy_dtype(field, self._byteorder), view,
+                field.offset, (self.size,))
+            return _aggregate_numpy(items, count, ops)
+        items = strided.values(view, field, self._byteorder, self.size, count)
+        result = {}
+        for op in ops:
+            if op == 'count':
+                result[op] = count
+            elif op == 'sum':
+                result[op] = sum(items)
+            elif op == 'hist':
+                result[op] = dict(Counter(items))
+            else:
+                result[op] = (min if op == 'min' else max)(items, default=None)
+        return result
+
+    def diff(self, old_buffer, new_buffer):
+        """
+        Finds changed records of two buffers of records.
+        Records are compared by bytes, only changed records are unpacked.
+        :param old_buffer: buffer of records
+        :param new_buffer: buffer of records
+        :return: list of RecordChange(index, old, new, fields),
+        fields is tuple of names of changed fields. Records present
+        in one buffer only have None instead of another record.
+        """
+        size = self.size
+        old_view, old_count = strided.records_view(old_buffer, size)
+        new_view, new_count = strided.records_view(new_buffer, size)
+        common = min(old_count, new_count) * size
+        changes = []
+        step = _diff_block * size
+        for block in range(0, common, step):
+            stop = min(block + step, common)
+            if old_view[block:stop] == new_view[block:stop]:
+                continue
+            for start in range(block, stop, size):
+                old = old_view[start:start + size]
+                new = new_view[start:start + size]
+                if old == new:
+                    continue
+                fields = tuple(field.name for field in self._fields
+                               if old[field.offset:field.offset + field.size]
+                               != new[field.offset:field.offset + field.size])
+                if fields:
+                    changes.append(RecordChange(start // size,
+                                                self.unpack(old),
+                                                self.unpack(new), fields))
+        names = self._nt._fields
+        for start in range(common, len(old_view), size):
+            changes.append(RecordChange(
+                start // size, self.unpack(old_view[start:start + size]),
+                None, names))
+        for start in range(common, len(new_view), size):
+            changes.append(RecordChange(
+                start // size, None,
+                self.unpack(new_view[start:start + size]), names))
+        return changes
+
+    def convert(self, buffer, to='<'):
+        """
+        Rewrites buffer of records from struct byte order to another.
+        Fields are swapped by byte lanes over all records at once,
+        records are not unpacked.
+        :param buffer: records in struct byte order
+        :param to: target byte order: '<', '>', '!' or '='
+        :rtype: bytearray
+        """
+        if self._byteorder == '@' or to == '@':
+            raise ValueError("Records with native alignment can't be "
+                             "converted to another byte order")
+        view, count = strided.records_view(buffer, self.size)
+        out = bytearray(view)
+        if (strided.normalize_byteorder(self._byteorder) ==
+                strided.normalize_byteorder(to)):
+            return out
+        for field in self._fields:
+            if field.symbol not in _unordered_symbols:
+                strided.reverse_lanes(out, view, field.offset, field.size,
+                                      self.size, count)
+        return out
+
+    def _field(self, name):
+        for field in self._fields:
+            if field.name == name:
+                return field
+        raise ValueError("Unknown field: " + repr(name))
+
+    def _raw_columns(self, buffer):
+        view, count = strided.records_view(buffer, self.size)
+        return [strided.column(view, field, self._byteorder,
+                               self.size, count)
+                for field in self._fields]
+
+    def _map_columns(self, columns):
+        return [self._map_column(name, column)
+                for name, column in zip(self._nt._fields, columns)]
+
+    def _map_column(self, name, column):
+        if name in self._batch_mappers:
+            return self._batch_mappers[name](list(column))
+        if name in self._mappers:
+            return list(map(self._mappers[name], column))
+        return column
+
+    def _iter_unpack_batches(self, buffer):
+        view = memoryview(buffer).cast('B')
+        step = self.batch_size * self.size
+        for start in range(0, len(view), step):
+            rows = self._struct.iter_unpack(view[start:start + step])
+            columns = self._map_columns(zip(*rows))
+            yield from map(self._nt._make, zip(*columns))
+
+    def _make(self, values):
+        return self._nt._make(map(self._conv, zip(self._nt._fields, values)))
 
     def _conv(self, item):
         if item[0] in self._mappers:
             return self._mappers[item[0]](item[1])
+        if item[0] in self._batch_mappers:
+            return self._batch_mappers[item[0]]([item[1]])[0]
 
         return item[1]
 
 
+def _getter(factory, names):
+    if len(names) == 1:
+        get = factory(names[0])
+        return lambda record: (get(record),)
+    if not names:
+        return lambda record: ()
+    return factory(*names)
+
+
+def _numpy_dtype(field, byteorder):
+    if field.symbol == '?':
+        return numpy.dtype('?')
+    if field.symbol in 'efd':
+        kind = 'f'
+    elif field.symbol in 'bhilqn':
+        kind = 'i'
+    else:
+        kind = 'u'
+    return numpy.dtype('{}{}{}'.format(strided.normalize_byteorder(byteorder),
+                                       kind, field.size))
+
+
+def _sum_numpy(items):
+    # same result as sum() of python values: floats are added as doubles,
+    # 8 bytes integers as python ints since int64 accumulator wraps around
+    if items.dtype.kind == 'f':
+        return items.sum(dtype=numpy.float64).item()
+    if items.dtype.itemsize == 8:
+        return items.sum(dtype=object)
+    return items.sum(dtype=numpy.int64).item()
+
+
+def _aggregate_numpy(items, count, ops):
+    result = {}
+    for op in ops:
+        if op == 'count':
+            result[op] = count
+        elif op == 'hist':
+            values, counts = numpy.unique(items, return_counts=True)
+            result[op] = dict(zip(values.tolist(), counts.tolist()))
+        elif op == 'sum':
+            result[op] = _sum_numpy(items)
+        elif count:
+            result[op] = getattr(items, op)().item()
+        else:
+            result[op] = None
+    return result
+
+
 def create_nt(name, fields):
     return namedtuple(name, fields)
@@ -0,0 +1,174 @@
+import ctypes
+
+_native_types = {
+    '?': ctypes.c_bool,
+    'c': ctypes.c_char,
+    'b': ctypes.c_byte,
+    'B': ctypes.c_ubyte,
+    'h': ctypes.c_short,
+    'H': ctypes.c_ushort,
+    'i': ctypes.c_int,
+    'I': ctypes.c_uint,
+    'l': ctypes.c_long,
+    'L': ctypes.c_ulong,
+    'q': ctypes.c_longlong,
+    'Q': ctypes.c_ulonglong,
+    'n': ctypes.c_ssize_t,
+    'N': ctypes.c_size_t,
+    'P': ctypes.c_void_p,
+    'f': ctypes.c_float,
+    'd': ctypes.c_double,
+}
+
+_sized_types = {
+    (True, 1): ctypes.c_int8,
+    (True, 2): ctypes.c_int16,
+    (True, 4): ctypes.c_int32,
+    (True, 8): ctypes.c_int64,
+    (False, 1): ctypes.c_uint8,
+    (False, 2): ctypes.c_uint16,
+    (False, 4): ctypes.c_uint32,
+    (False, 8): ctypes.c_uint64,
+}
+
+_sized_methods = {
+    (True, 1): 'int8',
+    (True, 2): 'int16',
+    (True, 4): 'int32',
+    (True, 8): 'int64',
+    (False, 1): 'uint8',
+    (False, 2): 'uint16',
+    (False, 4): 'uint32',
+    (False, 8): 'uint64',
+}
+
+_native_methods = {
+    '?': 'bool',
+    'c': 'byte',
+    'b': 'int8',
+    'B': 'uint8',
+    'h': 'int16',
+    'H': 'uint16',
+    'i': 'int32',
+    'I': 'uint32',
+    'l': 'long',
+    'L': 'ulong',
+    'q': 'int64',
+    'Q': 'uint64',
+    'P': 'native_pointer',
+    'f': 'float',
+    'd': 'double',
+}
+
+_bytes_types = (ctypes.c_char, ctypes.c_byte, ctypes.c_ubyte)
+
+
+def _swapped(base):
+    return base is not ctypes.Structure
+
+
+def _ctype(field, byteorder):
+    if field.symbol == 's':
+        return ctypes.c_char * field.size
+    if field.symbol == 'p':
+        return ctypes.c_ubyte * field.size
+    if field.symbol == 'e':
+        raise ValueError("half_precision field {!r} has no ctypes type"
+                         .format(field.name))
+    if byteorder == '@' or field.symbol in '?cfd':
+        return _native_types[field.symbol]
+    return _sized_types[field.symbol in 'bhilqn', field.size]
+
+
+def _structure_base(byteorder):
+    if byteorder == '<':
+        return ctypes.LittleEndianStructure
+    if byteorder in '>!':
+        return ctypes.BigEndianStructure
+    return ctypes.Structure
+
+
+def build_structure(name, fields, byteorder, size, packed=False):
+    """
+    Creates ctypes.Structure subclass with the same layout as records
+    :param name: name of structure
+    :param fields: sequence of Field
+    :param byteorder: byte order of records
+    :param size: size of record
+    :param packed: place fields at record offsets by explicit padding
+    instead of native alignment, so sizeof is equal to size
+    :return: ctypes.Structure subclass. Under '@' without packed
+    fields are aligned natively, so sizeof may include trailing padding
+    """
+    ctypes_fields = []
+    offset = 0
+    for field in fields:
+        if field.offset > offset:
+            ctypes_fields.append(('_skip_{}'.format(offset),
+                                  ctypes.c_char * (field.offset - offset)))
+        ctypes_fields.append((field.name, _ctype(field, byteorder)))
+        offset = field.offset + field.size
+    if size > offset:
+        ctypes_fields.append(('_skip_{}'.format(offset),
+                              ctypes.c_char * (size - offset)))
+    namespace = {'_fields_': ctypes_fields}
+    if byteorder != '@' or packed:
+        namespace['_pack_'] = 1
+    return type(name, (_structure_base(byteorder),), namespace)
+
+
+def _byteorder(structure):
+    if (_swapped(ctypes.LittleEndianStructure) and
+            issubclass(structure, ctypes.LittleEndianStructure)):
+        return '<'
+    if (_swapped(ctypes.BigEndianStructure) and
+            issubclass(structure, ctypes.BigEndianStructure)):
+        return '>'
+    if getattr(structure, '_pack_', 0):
+        return '='
+    return '@'
+
+
+def _spec_entry(name, ctype, byteorder):
+    if issubclass(ctype, ctypes.Array):
+        if ctype._type_ in _bytes_types:
+            return name, 'bytes', ctype._length_
+        raise ValueError("Array field {!r} is not supported, only arrays "
+                         "of bytes can be converted".format(name))
+    code = getattr(ctype, '_type_', None)
+    if not isinstance(code, str):
+        raise ValueError("Field {!r} of type {} is not supported"
+                         .format(name, ctype.__name__))
+    if code in 'bhilqBHILQ' and byteorder != '@':
+        return name, _sized_methods[code.islower(), ctypes.sizeof(ctype)]
+    if code == 'P' and byteorder != '@':
+        return name, _sized_methods[False, ctypes.sizeof(ctype)]
+    if code not in _native_methods:
+        raise ValueError("Field {!r} of type {} is not supported"
+                         .format(name, ctype.__name__))
+    return name, _native_methods[code]
+
+
+def spec_from_structure(structure):
+    """
+    Describes ctypes.Structure subclass as fields spec
+    :param structure: ctypes.Structure subclass
+    :return: (byteorder, spec), spec is suitable for
+    StructNamedFormatter.from_spec
+    """
+    byteorder = _byteorder(structure)
+    spec = []
+    offset = 0
+    for item in structure._fields_:
+        if len(item) != 2:
+            raise ValueError("Bit field {!r} is not supported"
+                             .format(item[0]))
+        name, ctype = item
+        descriptor = getattr(structure, name)
+        if byteorder != '@' and descriptor.offset > offset:
+            spec.append((None, 'skip_bytes', descriptor.offset - offset))
+        spec.append(_spec_entry(name, ctype, byteorder))
+        offset = descriptor.offset + descriptor.size
+    if ctypes.sizeof(structure) > offset:
+        spec.append((None, 'skip_bytes', ctypes.sizeof(structure) - offset))
+    return byteorder, spec
@@ -0,0 +1,142 @@
+import array
+import struct
+import sys
+
+_native_byteorder = '<' if sys.byteorder == 'little' else '>'
+
+
+def normalize_byteorder(byteorder):
+    """
+    Resolves struct byte order character to '<' or '>'
+    :param byteorder: one of '@', '=', '<', '>', '!'
+    :rtype: str
+    """
+    if byteorder in '@=':
+        return _native_byteorder
+    if byteorder == '!':
+        return '>'
+    if byteorder in '<>':
+        return byteorder
+    raise ValueError("Unknown byte order: " + repr(byteorder))
+
+
+def records_view(buffer, record_size):
+    """
+    Flat bytes view of buffer with whole records
+    :param buffer: object supporting buffer protocol
+    :param record_size: size of one record
+    :return: (memoryview, count of records)
+    """
+    view = memoryview(buffer).cast('B')
+    if record_size == 0 or len(view) % record_size:
+        raise ValueError("Buffer size should be a multiple of "
+                         "record size " + str(record_size))
+    return view, len(view) // record_size
+
+
+def gather(view, offset, size, stride, count):
+    """
+    Copies field bytes of every record into contiguous buffer.
+    Works by byte lanes, so cost doesn't depend on records count
+    in python code.
+    :param view: flat bytes view of records
+    :param offset: offset of field in record
+    :param size: size of field
+    :param stride: size of record
+    :param count: count of records
+    :rtype: bytearray
+    """
+    out = bytearray(size * count)
+    if not count:
+        return out
+    stop = offset + (count - 1) * stride + 1
+    for lane in range(size):
+        out[lane::size] = view[offset + lane:stop + lane:stride]
+    return out
+
+
+def reverse_lanes(out, view, offset, size, stride, count):
+    """
+    Writes field bytes of every record in reversed order into out
+    :param out: writable flat bytes buffer, same layout as view
+    :param view: flat bytes view of records
+    :param offset: offset of field in record
+    :param size: size of field
+    :param stride: size of record
+    :param count: count of records
+    """
+    if not count:
+        return
+    stop = offset + (count - 1) * stride + 1
+    for lane in range(size):
+        out[offset + lane:stop + lane:stride] = \
+            view[offset + size - 1 - lane:stop + size - 1 - lane:stride]
+
+
+_array_typecodes = {
+    'b': 'bhilq', 'h': 'bhilq', 'i': 'bhilq', 'l': 'bhilq', 'q': 'bhilq',
+    'n': 'bhilq',
+    'B': 'BHILQ', 'H': 'BHILQ', 'I': 'BHILQ', 'L': 'BHILQ', 'Q': 'BHILQ',
+    'N': 'BHILQ', 'P': 'BHILQ',
+    'f': 'fd', 'd': 'fd',
+}
+
+
+def array_typecode(symbol, size):
+    """
+    Finds array typecode for struct field
+    :param symbol: struct format symbol
+    :param size: size of field
+    :return: typecode or None if array can't hold the field
+    """
+    for typecode in _array_typecodes.get(symbol, ''):
+        if array.array(typecode).itemsize == size:
+            return typecode
+    return None
+
+
+def column(view, field, byteorder, stride, count):
+    """
+    Extracts values of one field from all records
+    :param view: flat bytes view of records
+    :param field: Field of records
+    :param byteorder: byte order of records
+    :param stride: size of record
+    :param count: count of records
+    :return: array if field is numeric, list otherwise
+    """
+    data = gather(view, field.offset, field.size, stride, count)
+    typecode = array_typecode(field.symbol, field.size)
+    if typecode:
+        values = array.array(typecode)
+        values.frombytes(data)
+        if normalize_byteorder(byteorder) != _native_byteorder:
+            values.byteswap()
+        return values
+    if field.symbol in 'sp':
+        fmt = byteorder + str(field.size) + field.symbol
+    else:
+        fmt = byteorder + field.symbol
+    return [item[0] for item in struct.iter_unpack(fmt, data)]
+
+
+def values(view, field, byteorder, stride, count):
+    """
+    Values of one field from all records, without copying
+    when field can be read by strided memoryview
+    :param view: flat bytes view of records
+    :param field: Field of records
+    :param byteorder: byte order of records
+    :param stride: size of record
+    :param count: count of records
+    :return: memoryview, array or list
+    """
+    if not count:
+        return []
+    typecode = '?' if field.symbol == '?' else \
+        array_typecode(field.symbol, field.size)
+    if (typecode and stride % field.size == 0 and
+            normalize_byteorder(byteorder) == _native_byteorder):
+        stop = field.offset + (count - 1) * stride + field.size
+        return view[field.offset:stop].cast(typecode)[::stride // field.size]
+    return column(view, field, byteorder, stride, count)
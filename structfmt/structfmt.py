@@ -1,5 +1,13 @@
 from .StructFormatter import StructFormatter
 from .StructNamedFormatter import StructNamedFormatter
+from . import ctypesfmt
+
+_byteorder_methods = {
+    '@': StructNamedFormatter.native_alignment_endian,
+    '=': StructNamedFormatter.native_endian,
+    '<': StructNamedFormatter.little_endian,
+    '>': StructNamedFormatter.big_endian,
+}
 
 
 def struct_format():
@@ -17,3 +25,16 @@ def struct_named_format(struct_name):
     :rtype: StructNamedFormatter
     """
     return StructNamedFormatter(struct_name)
+
+
+def struct_named_format_from_ctypes(structure):
+    """
+    Creates formatter with fields of ctypes structure
+
+    :param structure: ctypes.Structure subclass
+    :rtype: StructNamedFormatter
+    """
+    byteorder, spec = ctypesfmt.spec_from_structure(structure)
+    formatter = StructNamedFormatter(structure.__name__)
+    _byteorder_methods[byteorder](formatter)
+    return formatter.from_spec(spec)
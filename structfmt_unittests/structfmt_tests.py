@@ -1,4 +1,6 @@
 from structfmt import structfmt
+import struct
+import sys
 import unittest
 
 
@@ -74,6 +76,13 @@ class StructFormatTests(unittest.TestCase):
                ).build_format_string()
         self.assertEqual('h5xi', fmt)
 
+    def test_offset(self):
+        standard = structfmt.struct_format().little_endian().int8().long()
+        aligned = structfmt.struct_format().int8().int32().int16()
+
+        self.assertEqual(5, standard.offset)
+        self.assertEqual(10, aligned.offset)
+
 
 class StructNamedFormatTests(unittest.TestCase):
     def test_fmt_named(self):
@@ -175,3 +184,681 @@ class StructNamedFormatTests(unittest.TestCase):
         self.assertEqual('80:00:20:7a:3f:3e', decoded.MacDestination)
         self.assertEqual('80:00:20:20:3a:ae', decoded.MacSource)
         self.assertEqual('IPv4', decoded.PacketType)
+
+
+class FormattedStructConvertTests(unittest.TestCase):
+    def test_layout(self):
+        s = (structfmt.struct_named_format("name")
+             .native_alignment_endian()
+             .int8("a")
+             .int32("b")
+             .skip_bytes(2)
+             .bytes("c", 3)
+             .int16("d")
+             ).build_formatted_struct()
+
+        self.assertEqual([0, 4, 10, 14],
+                         [field.offset for field in s.fields])
+        self.assertEqual([1, 4, 3, 2], [field.size for field in s.fields])
+
+    def test_convert(self):
+        big = (structfmt.struct_named_format("name")
+               .big_endian()
+               .int32("a")
+               .bytes("b", 3)
+               .uint16("c")
+               .double("d")
+               ).build_formatted_struct()
+        little = (structfmt.struct_named_format("name")
+                  .little_endian()
+                  .int32("a")
+                  .bytes("b", 3)
+                  .uint16("c")
+                  .double("d")
+                  ).build_formatted_struct()
+        records = [(-5, b'abc', 0x1234, 1.5), (7, b'xyz', 2, -0.25)]
+        packed = b''.join(big.pack(*record) for record in records)
+
+        converted = big.convert(packed, to='<')
+
+        self.assertEqual(b''.join(little.pack(*record) for record in records),
+                         converted)
+        self.assertEqual(packed, big.convert(packed, to='!'))
+
+    def test_convert_aligned(self):
+        s = (structfmt.struct_named_format("name")
+             .int32("a")
+             ).build_formatted_struct()
+
+        self.assertRaises(ValueError, s.convert, s.pack(1), '<')
+
+
+class RecordBatchTests(unittest.TestCase):
+    def setUp(self):
+        self.s = (structfmt.struct_named_format("name")
+                  .big_endian()
+                  .int32("a")
+                  .bytes("b", 2)
+                  .uint16("c", mapper=lambda x: x * 2)
+                  .double("d")
+                  ).build_formatted_struct()
+        self.records = [(i, b'%02d' % i, i + 1, i / 2) for i in range(10)]
+        self.packed = b''.join(self.s.pack(*r) for r in self.records)
+
+    def test_unpack_batch(self):
+        batch = self.s.unpack_batch(self.packed)
+
+        self.assertEqual(10, len(batch))
+        self.assertEqual(self.s.unpack(self.packed[:self.s.size]), batch[0])
+        self.assertEqual(list(range(10)), list(batch.column("a")))
+        self.assertEqual([self.s.unpack_from(self.packed, i * self.s.size)
+                          for i in range(10)],
+                         batch.to_pylist())
+
+    def test_slice_filter_take(self):
+        batch = self.s.unpack_batch(self.packed)
+
+        self.assertEqual([2, 3], list(batch[2:4].column("a")))
+        self.assertEqual([0, 4, 8],
+                         list(batch.filter(lambda x: x % 4 == 0, "a")
+                              .column("a")))
+        self.assertEqual([b'09', b'01'],
+                         [r.b for r in batch.take([9, 1])])
+        self.assertEqual(9, len(batch.filter(lambda r: r.c > 2)))
+
+
+class BatchMapperTests(unittest.TestCase):
+    def test_batch_mapper(self):
+        calls = []
+
+        def plus_one(values):
+            calls.append(len(values))
+            return [x + 1 for x in values]
+
+        s = (structfmt.struct_named_format("name")
+             .little_endian()
+             .int32("a", batch_mapper=plus_one)
+             .int16("b", mapper=str)
+             ).build_formatted_struct()
+        s.batch_size = 4
+        packed = b''.join(s.pack(i, i) for i in range(10))
+
+        unpacked = list(s.iter_unpack(packed))
+
+        self.assertEqual([4, 4, 2], calls)
+        self.assertEqual(list(range(1, 11)), [r.a for r in unpacked])
+        self.assertEqual([str(i) for i in range(10)], [r.b for r in unpacked])
+        self.assertEqual((6, '5'), s.unpack(packed[30:36]))
+        self.assertEqual(list(range(1, 11)),
+                         s.unpack_batch(packed).column("a"))
+
+    def test_iter_unpack_mapper(self):
+        s = (structfmt.struct_named_format("name")
+             .little_endian()
+             .int32("a", mapper=lambda x: -x)
+             ).build_formatted_struct()
+
+        unpacked = list(s.iter_unpack(s.pack(1) + s.pack(2)))
+
+        self.assertEqual([-1, -2], [r.a for r in unpacked])
+
+
+class FromSpecTests(unittest.TestCase):
+    def test_from_spec(self):
+        s = (structfmt.struct_named_format("name")
+             .little_endian()
+             .from_spec([("a", "int32"),
+                         (None, "skip_bytes", 2),
+                         ("b", "bytes", 3, bytes.upper),
+                         ("c", "uint16", 1)])
+             ).build_formatted_struct()
+
+        self.assertEqual(11, s.size)
+        self.assertEqual((1, b'ABC', 2),
+                         s.unpack(b'\x01\x00\x00\x00\x00\x00abc\x02\x00'))
+
+    def test_from_dict(self):
+        fmt = (structfmt.struct_named_format("name")
+               .int8("a")
+               .from_spec({"b": "int8", "c": ("bytes", 4)})
+               ).build_format_string()
+
+        self.assertEqual('2b4s', fmt)
+
+    def test_errors(self):
+        fmt = structfmt.struct_named_format("name").int8("a")
+
+        for spec in ([("b", "int33")], [("b", "bytes")], [("a", "int8")],
+                     [("b", "int8"), ("b", "int16")], [("_b", "int8")],
+                     [("b", "int8", 2)], [(None, "int8")]):
+            self.assertRaises(ValueError, fmt.from_spec, spec)
+        self.assertEqual('b', fmt.build_format_string())
+
+    def test_native_only_types(self):
+        fmt = structfmt.struct_named_format("name").little_endian().int8("a")
+
+        for spec in ([("b", "int32"), ("c", "size_t")],
+                     [("b", "ssize_t")], [("b", "native_pointer")]):
+            self.assertRaises(ValueError, fmt.from_spec, spec)
+        self.assertEqual('<b', fmt.build_format_string())
+        self.assertEqual('<bP', fmt.native_pointer("b").build_format_string())
+        self.assertRaises(struct.error, fmt.build_formatted_struct)
+
+    def test_batch_mapper(self):
+        s = (structfmt.struct_named_format("name")
+             .little_endian()
+             .from_spec([("a", "int8", 1, None, None,
+                          lambda xs: [x * 2 for x in xs])])
+             ).build_formatted_struct()
+
+        self.assertEqual([2, 4], [r.a for r in s.iter_unpack(b'\x01\x02')])
+        self.assertRaises(ValueError,
+                          structfmt.struct_named_format("name").from_spec,
+                          [("a", "int8", 1, str, None, list)])
+
+    def test_duplicate_fields(self):
+        fmt = structfmt.struct_named_format("name").int8("a")
+
+        self.assertRaises(ValueError, fmt.int16, "b", "a")
+
+
+class CTypesTests(unittest.TestCase):
+    def test_to_ctypes(self):
+        import ctypes
+        for fmt in (structfmt.struct_named_format("name"),
+                    structfmt.struct_named_format("name").big_endian()):
+            fmt.int8("a").int32("b").skip_bytes(3).bytes("c", 2).double("d")
+            s = fmt.build_formatted_struct()
+            structure = fmt.build_ctypes_structure()
+
+            self.assertEqual([field.offset for field in s.fields],
+                             [getattr(structure, field.name).offset
+                              for field in s.fields])
+            self.assertTrue(s.size <= ctypes.sizeof(structure))
+
+    def test_ctypes_view(self):
+        s = (structfmt.struct_named_format("name")
+             .big_endian()
+             .int16("a")
+             .uint32("b")
+             ).build_formatted_struct()
+        buffer = bytearray(b'\xff' + s.pack(-2, 7))
+
+        view = s.ctypes_view(buffer, 1)
+        view.b = 0x01020304
+
+        self.assertEqual(-2, view.a)
+        self.assertEqual((-2, 0x01020304), s.unpack_from(buffer, 1))
+
+    def test_ctypes_view_trailing_padding(self):
+        import ctypes
+        s = (structfmt.struct_named_format("name")
+             .native_alignment_endian()
+             .int32("a")
+             .int8("b")
+             ).build_formatted_struct()
+        buffer = bytearray(s.pack(1, 2) + s.pack(3, 4))
+
+        view = s.ctypes_view(buffer, s.size)
+        view.b = 5
+
+        self.assertEqual(8, ctypes.sizeof(s.ctypes_structure))
+        self.assertEqual(s.size, ctypes.sizeof(view))
+        single = s.ctypes_view(bytearray(s.pack(1, 2)))
+        self.assertEqual((1, 2), (single.a, single.b))
+        self.assertEqual((3, 5), s.unpack_from(buffer, s.size))
+
+    def test_from_ctypes(self):
+        import ctypes
+
+        class Aligned(ctypes.Structure):
+            _fields_ = [('a', ctypes.c_char), ('b', ctypes.c_long),
+                        ('c', ctypes.c_char * 3)]
+
+        class Packed(ctypes.BigEndianStructure):
+            _pack_ = 2
+            _fields_ = [('a', ctypes.c_uint8), ('b', ctypes.c_int32),
+                        ('c', ctypes.c_uint16)]
+
+        for structure in (Aligned, Packed):
+            s = (structfmt.struct_named_format_from_ctypes(structure)
+                 .build_formatted_struct())
+            self.assertEqual(ctypes.sizeof(structure), s.size)
+            self.assertEqual([getattr(structure, field.name).offset
+                              for field in s.fields],
+                             [field.offset for field in s.fields])
+
+        packed = Packed(1, -5, 3)
+        self.assertEqual((1, -5, 3), s.unpack(bytes(packed)))
+
+
+class CompressedRecordReaderTests(unittest.TestCase):
+    def setUp(self):
+        self.s = (structfmt.struct_named_format("name")
+                  .little_endian()
+                  .int32("a")
+                  .bytes("b", 3, mapper=bytes.decode)
+                  ).build_formatted_struct()
+        self.records = [(i, str(i % 1000).zfill(3)) for i in range(5000)]
+        self.packed = b''.join(self.s.pack(a, b.encode())
+                               for a, b in self.records)
+
+    def test_codecs(self):
+        import bz2
+        import gzip
+        import io
+        import lzma
+
+        for compress in (gzip.compress, bz2.compress, lzma.compress):
+            reader = self.s.read_compressed(io.BytesIO(compress(self.packed)),
+                                            chunk_size=1000)
+
+            self.assertEqual(self.records, [tuple(r) for r in reader])
+            self.assertEqual(5000, reader.stats.records)
+            self.assertEqual(len(self.packed),
+                             reader.stats.decompressed_bytes)
+
+    def test_detection_with_small_chunks(self):
+        import io
+        import lzma
+
+        s = (structfmt.struct_named_format("name")
+             .int8("a")).build_formatted_struct()
+        reader = s.read_compressed(io.BytesIO(lzma.compress(b'\x01\x02')),
+                                   chunk_size=4)
+
+        self.assertEqual([(1,), (2,)], [tuple(r) for r in reader])
+        self.assertEqual([], list(s.read_compressed(io.BytesIO())))
+
+    def test_batches_of_concatenated_streams(self):
+        import gzip
+        import io
+
+        data = gzip.compress(self.packed[:7001]) + \
+            gzip.compress(self.packed[7001:])
+        reader = self.s.read_compressed(io.BytesIO(data), codec='gzip',
+                                        chunk_size=4096)
+
+        batches = list(reader.iter_batches())
+
+        self.assertTrue(len(batches) > 1)
+        self.assertEqual(self.records,
+                         [tuple(r) for b in batches for r in b])
+
+    def test_truncated(self):
+        import gzip
+        import io
+
+        data = gzip.compress(self.packed[:-1])
+        reader = self.s.read_compressed(io.BytesIO(data))
+        self.assertRaises(ValueError, list, reader)
+
+        data = gzip.compress(self.packed)[:-20]
+        reader = self.s.read_compressed(io.BytesIO(data))
+        self.assertRaises(EOFError, list, reader)
+
+
+class RecordRingTests(unittest.TestCase):
+    def setUp(self):
+        self.s = (structfmt.struct_named_format("name")
+                  .little_endian()
+                  .int32("a")
+                  .int16("b", mapper=lambda x: -x)
+                  ).build_formatted_struct()
+
+    def test_put_get(self):
+        with self.s.create_ring(4) as producer:
+            consumer = self.s.attach_ring(producer.name)
+            try:
+                self.assertEqual(3, producer.put_many([(1, 1), (2, 2),
+                                                       (3, 3)]))
+                self.assertEqual([(1, -1), (2, -2)], consumer.get_batch(2))
+                self.assertEqual(3, producer.put_many([(i, i)
+                                                       for i in range(4, 8)]))
+                self.assertFalse(producer.put(8, 8))
+                self.assertEqual(4, len(consumer))
+                self.assertEqual([3, 4, 5, 6],
+                                 [r.a for r in consumer.get_batch()])
+                self.assertTrue(producer.put(9, 9))
+                self.assertEqual([], consumer.get_batch(0))
+                self.assertEqual([(9, -9)], consumer.get_batch())
+            finally:
+                consumer.close()
+
+    def test_attach_from_other_process(self):
+        import os
+        import subprocess
+
+        code = '''if True:
+            import sys
+            from structfmt import structfmt
+            s = (structfmt.struct_named_format("name")
+                 .little_endian().int32("a").int16("b")
+                 ).build_formatted_struct()
+            consumer = s.attach_ring(sys.argv[1])
+            print([tuple(r) for r in consumer.get_batch()])
+            consumer.close()
+        '''
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        with self.s.create_ring(4) as producer:
+            producer.put_many([(1, 1), (2, 2)])
+
+            result = subprocess.run([sys.executable, '-c', code,
+                                     producer.name],
+                                    cwd=root, stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE, check=True)
+
+            self.assertEqual(b'[(1, 1), (2, 2)]', result.stdout.strip())
+            self.assertEqual(b'', result.stderr)
+            consumer = self.s.attach_ring(producer.name)
+            consumer.close()
+
+    def test_record_size_mismatch(self):
+        other = (structfmt.struct_named_format("name")
+                 .int8("a")).build_formatted_struct()
+
+        with self.s.create_ring(2) as ring:
+            self.assertRaises(ValueError, other.attach_ring, ring.name)
+
+    def test_pack_into(self):
+        buffer = bytearray(8)
+
+        self.s.pack_into(buffer, 2, 1, 2)
+
+        self.assertEqual(b'\x00\x00\x01\x00\x00\x00\x02\x00', buffer)
+
+
+class AggregateTests(unittest.TestCase):
+    @staticmethod
+    def implementations():
+        """
+        stdlib implementation, and numpy one if numpy is installed
+        """
+        import contextlib
+        from unittest import mock
+        result = [('stdlib', mock.patch('structfmt.numpy', None))]
+        if sys.modules['structfmt'].numpy is not None:
+            result.append(('numpy', contextlib.nullcontext()))
+        return result
+
+    def test_aggregate(self):
+        values = [5, -3, 7, 5, 0]
+        for name, implementation in self.implementations():
+            for byteorder in ('native_endian', 'big_endian'):
+                for padding in (0, 1):
+                    fmt = structfmt.struct_named_format("name")
+                    getattr(fmt, byteorder)()
+                    s = (fmt.int16("a").skip_bytes(padding).int32("b")
+                         .double("c")).build_formatted_struct()
+                    packed = b''.join(s.pack(1, v, v / 2) for v in values)
+
+                    with self.subTest(name), implementation:
+                        self.assertEqual({'sum': 14, 'min': -3, 'max': 7,
+                                          'count': 5,
+                                          'hist': {5: 2, -3: 1, 7: 1, 0: 1}},
+                                         s.aggregate(packed, "b"))
+                        self.assertEqual({'max': 3.5},
+                                         s.aggregate(packed, "c",
+                                                     ops=('max',)))
+
+    def test_aggregate_odd_record_sizes(self):
+        values = [5, -3, 7]
+        for name, implementation in self.implementations():
+            for build in (lambda f: f.int8("a").int16("b").int8("c"),
+                          lambda f: f.int16("a").int32("b").int16("c")):
+                s = build(structfmt.struct_named_format("name")
+                          .native_endian()).build_formatted_struct()
+                packed = b''.join(s.pack(1, v, 2) for v in values)
+
+                with self.subTest(name), implementation:
+                    self.assertEqual({'sum': 9, 'min': -3, 'max': 7},
+                                     s.aggregate(packed, "b",
+                                                 ops=('sum', 'min', 'max')))
+                    self.assertEqual({'count': 3, 'hist': {2: 3}},
+                                     s.aggregate(packed, "c",
+                                                 ops=('count', 'hist')))
+
+    def test_aggregate_sum_precision(self):
+        s = (structfmt.struct_named_format("name")
+             .little_endian()
+             .uint64("a")
+             .int64("b")
+             .float("c")
+             ).build_formatted_struct()
+        packed = b''.join(s.pack(*record) for record in
+                          [(2 ** 63 + 5, 2 ** 63 - 1, 2.0 ** 24),
+                           (2 ** 63 + 7, 2 ** 63 - 2, 1.0),
+                           (3, -2 ** 63, 1.0)])
+        for name, implementation in self.implementations():
+            with self.subTest(name), implementation:
+                self.assertEqual({'sum': 2 ** 64 + 15},
+                                 s.aggregate(packed, "a", ('sum',)))
+                self.assertEqual({'sum': 2 ** 63 - 3},
+                                 s.aggregate(packed, "b", ('sum',)))
+                self.assertEqual({'sum': 2.0 ** 24 + 2},
+                                 s.aggregate(packed, "c", ('sum',)))
+
+    def test_aggregate_empty(self):
+        empty = {'sum': 0, 'min': None, 'max': None, 'count': 0, 'hist': {}}
+        s = (structfmt.struct_named_format("name")
+             .uint8("a")
+             .int32("b")).build_formatted_struct()
+        for name, implementation in self.implementations():
+            with self.subTest(name), implementation:
+                self.assertEqual(empty, s.aggregate(b'', "a"))
+                self.assertEqual(empty, s.aggregate(b'', "b"))
+                self.assertRaises(ValueError, s.aggregate, b'', "c")
+                self.assertRaises(ValueError, s.aggregate, b'', "a",
+                                  ('avg',))
+
+
+class EncoderTests(unittest.TestCase):
+    def setUp(self):
+        def bytes_to_mac_string(b):
+            return ':'.join(format(x, '02x') for x in b)
+
+        def mac_string_to_bytes(s):
+            return bytes.fromhex(s.replace(':', ''))
+
+        self.s = (structfmt.struct_named_format("Ethernet")
+                  .little_endian()
+                  .bytes("MacDestination", 6, mapper=bytes_to_mac_string,
+                         encoder=mac_string_to_bytes)
+                  .int16("PacketType")
+                  ).build_formatted_struct()
+        self.packed = b'\x80\x00\x20\x7a\x3f\x3e\x08\x00'
+
+    def test_round_trip(self):
+        decoded = self.s.unpack(self.packed)
+
+        self.assertEqual(self.packed, self.s.pack_record(decoded))
+        self.assertEqual(self.packed * 2,
+                         self.s.pack_many_records([decoded, decoded]))
+
+    def test_mapping(self):
+        record = {"PacketType": 8, "MacDestination": '80:00:20:7a:3f:3e'}
+
+        self.assertEqual(self.packed, self.s.pack_record(record))
+
+    def test_single_field(self):
+        s = (structfmt.struct_named_format("name")
+             .from_spec([("a", "uint8", 1, None, lambda x: x + 1)])
+             ).build_formatted_struct()
+
+        self.assertEqual(b'\x02', s.pack_record({"a": 1}))
+
+
+class CacheTests(unittest.TestCase):
+    def build(self, fmt):
+        return (fmt.little_endian()
+                .int16("a", mapper=lambda x: [x])
+                ).build_formatted_struct()
+
+    def test_cache(self):
+        s = self.build(structfmt.struct_named_format("name")).enable_cache(2)
+        packed = s.pack(1) + s.pack(2) + s.pack(1) + s.pack(3)
+
+        first = s.unpack(packed[:2])
+        records = list(s.iter_unpack(packed))
+
+        self.assertIs(first, records[0])
+        self.assertIs(first, records[2])
+        self.assertIs(records[3], s.unpack_from(packed, 6))
+        info = s.cache_info()
+        self.assertEqual((3, 3, 2, 2), info)
+        self.assertEqual(0.5, info.hit_rate)
+        self.assertIsNone(s.disable_cache().cache_info())
+
+    def test_unpack_from_offsets(self):
+        s = self.build(structfmt.struct_named_format("name")).enable_cache()
+        packed = s.pack(1) + s.pack(2) + s.pack(3)
+
+        self.assertEqual(([3],), s.unpack_from(packed, -2))
+        self.assertEqual(([2],), s.unpack_from(packed, -4))
+        for offset in (-7, 5, 6):
+            self.assertRaises(struct.error, s.unpack_from, packed, offset)
+
+    def test_batch_mappers(self):
+        sizes = []
+
+        def mapper(values):
+            sizes.append(len(values))
+            return values
+
+        s = (structfmt.struct_named_format("name")
+             .int8("a", batch_mapper=mapper)
+             ).build_formatted_struct().enable_cache()
+
+        self.assertEqual([(1,), (2,), (1,)],
+                         list(s.iter_unpack(b'\x01\x02\x01')))
+        self.assertEqual([3], sizes)
+
+    def test_impure_mappers(self):
+        s = self.build(structfmt.struct_named_format("name")
+                       .impure_mappers()).enable_cache()
+
+        self.assertIsNone(s.cache_info())
+        self.assertIsNot(s.unpack(s.pack(1)), s.unpack(s.pack(1)))
+        self.assertRaises(ValueError, s.enable_cache, 0)
+
+
+class DiffTests(unittest.TestCase):
+    def test_diff(self):
+        s = (structfmt.struct_named_format("name")
+             .little_endian()
+             .int32("a")
+             .skip_bytes(1)
+             .bytes("b", 2, mapper=bytes.decode)
+             ).build_formatted_struct()
+        old = [s.pack(i, b'%02d' % (i % 100)) for i in range(1000)]
+        new = list(old)
+        new[3] = s.pack(3, b'xx')
+        new[700] = s.pack(-1, b'yy')
+        new[5] = b'\x05\x00\x00\x00\xff05'  # padding only
+
+        changes = s.diff(b''.join(old), b''.join(new + [s.pack(7, b'zz')]))
+
+        self.assertEqual([3, 700, 1000], [c.index for c in changes])
+        self.assertEqual(('b',), changes[0].fields)
+        self.assertEqual(((700, '00'), (-1, 'yy')),
+                         (changes[1].old, changes[1].new))
+        self.assertEqual(('a', 'b'), changes[1].fields)
+        self.assertEqual((None, (7, 'zz')), changes[2][1:3])
+        self.assertEqual([], s.diff(b''.join(old), b''.join(old)))
+
+
+class ColumnarFileTests(unittest.TestCase):
+    def setUp(self):
+        self.s = (structfmt.struct_named_format("name")
+                  .big_endian()
+                  .uint32("time")
+                  .int16("level")
+                  .bytes("host", 4, mapper=bytes.decode)
+                  .double("value")
+                  ).build_formatted_struct()
+        self.records = [(1000 + i * 3, -(i // 10), b'h%03d' % (i % 4), i / 4)
+                        for i in range(250)]
+        self.packed = b''.join(self.s.pack(*r) for r in self.records)
+
+    def write(self, chunk_size=100):
+        import io
+
+        fileobj = io.BytesIO()
+        with self.s.write_columnar(fileobj, chunk_size) as writer:
+            writer.write(self.packed[:self.s.size * 30])
+            writer.write(self.packed[self.s.size * 30:])
+        fileobj.seek(0)
+        return fileobj
+
+    def test_round_trip(self):
+        fileobj = self.write()
+
+        reader = self.s.read_columnar(fileobj)
+
+        self.assertEqual(3, reader.chunk_count)
+        self.assertEqual(250, len(reader))
+        self.assertEqual(list(self.s.iter_unpack(self.packed)),
+                         reader.read().to_pylist())
+        self.assertTrue(len(fileobj.getvalue()) < len(self.packed))
+
+    def test_select(self):
+        reader = self.s.read_columnar(self.write())
+
+        self.assertEqual([(1000, 1297), (1300, 1597), (1600, 1747)],
+                         reader.chunk_stats("time"))
+        self.assertEqual([(b'h000', b'h003')] * 3, reader.chunk_stats("host"))
+        chunks = reader.select_chunks("time", min_value=1400)
+        self.assertEqual([1, 2], chunks)
+
+        batch = reader.read(columns=["host", "level"], chunks=chunks)
+
+        self.assertEqual(('host', 'level'), batch.namedtuple._fields)
+        self.assertEqual(('h000', -10), batch[0])
+        self.assertEqual(150, len(batch))
+        self.assertRaises(ValueError, reader.read, ["time", "other"])
+
+    def test_select_nan(self):
+        import io
+
+        nan = float('nan')
+        self.packed = b''.join(
+            self.s.pack(1000, 0, b'h000', value)
+            for value in (nan, 1.0, 5.0, nan, nan, nan))
+        fileobj = io.BytesIO()
+        with self.s.write_columnar(fileobj, 3) as writer:
+            writer.write(self.packed)
+
+        self.assertNotIn(b'NaN', fileobj.getvalue())
+        fileobj.seek(0)
+        reader = self.s.read_columnar(fileobj)
+
+        self.assertEqual([(1.0, 5.0), (None, None)],
+                         reader.chunk_stats("value"))
+        self.assertEqual([0], reader.select_chunks("value", min_value=2.0))
+        self.assertEqual([0], reader.select_chunks("value", max_value=2.0))
+        self.assertEqual([0, 1], reader.select_chunks("value"))
+
+    def test_select_infinity(self):
+        import io
+
+        inf = float('inf')
+        self.packed = b''.join(self.s.pack(1000, 0, b'h000', value)
+                               for value in (-inf, 1.0, 5.0, 7.0, inf))
+        fileobj = io.BytesIO()
+        with self.s.write_columnar(fileobj, 3) as writer:
+            writer.write(self.packed)
+
+        self.assertNotIn(b'Infinity', fileobj.getvalue())
+        fileobj.seek(0)
+        reader = self.s.read_columnar(fileobj)
+
+        self.assertEqual([(-inf, 5.0), (7.0, inf)],
+                         reader.chunk_stats("value"))
+        self.assertEqual([1], reader.select_chunks("value", min_value=6.0))
+        self.assertEqual([0], reader.select_chunks("value", max_value=-1e300))
+
+    def test_schema_mismatch(self):
+        other = (structfmt.struct_named_format("name")
+                 .uint32("time")).build_formatted_struct()
+
+        self.assertRaises(ValueError, other.read_columnar, self.write())